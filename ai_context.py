@@ -0,0 +1,120 @@
+"""
+Контекст AI-диалога в пределах сессии.
+
+Хранит предыдущие вопросы, SQL и DataFrame-результаты с ограничением
+по количеству и по памяти (старые вытесняются первыми). Follow-up
+вопросы можно выполнить локально: кэшированные фреймы загружаются во
+временную in-memory SQLite как таблицы r1, r2, ... — без похода в Postgres.
+"""
+
+import re
+import sqlite3
+
+import pandas as pd
+
+
+class AnalysisContext:
+    def __init__(self, max_entries: int = 10, max_bytes: int = 50 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = []
+        self._next_id = 1
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(e["bytes"] for e in self.entries)
+
+    def add(self, question: str, sql: str, df: pd.DataFrame, source: str) -> dict:
+        """Запоминает результат; фрейм больше лимита не кэшируется целиком.
+        Повторяющиеся имена колонок (JOIN от модели) делаются уникальными —
+        иначе SQLite не создаст таблицу."""
+        if df.columns.map(lambda c: str(c).lower()).duplicated().any():
+            df = df.set_axis(_unique_columns(df.columns), axis=1)
+        size = int(df.memory_usage(deep=True).sum())
+        entry = {
+            "id": self._next_id,
+            "table": f"r{self._next_id}",
+            "question": question,
+            "sql": sql,
+            "source": source,
+            "df": df if size <= self.max_bytes else None,
+            "rows": len(df),
+            "bytes": size if size <= self.max_bytes else 0,
+        }
+        self._next_id += 1
+        self.entries.append(entry)
+        self._evict()
+        return entry
+
+    def _evict(self):
+        while len(self.entries) > self.max_entries:
+            self.entries.pop(0)
+        # Фреймы вытесняем, а вопросы/SQL оставляем — они нужны как история
+        for e in self.entries:
+            if self.total_bytes <= self.max_bytes:
+                break
+            if e["df"] is not None:
+                e["df"], e["bytes"] = None, 0
+
+    def clear(self):
+        self.entries = []
+
+    def cached(self) -> list:
+        return [e for e in self.entries if e["df"] is not None]
+
+    def history(self) -> str:
+        return "\n".join(f"{i+1}. {e['question']}" for i, e in enumerate(self.entries))
+
+    def describe(self, sample_rows: int = 3) -> str:
+        """Описание кэшированных таблиц для промпта: вопрос, SQL, колонки, пример строк"""
+        blocks = []
+        for e in self.cached():
+            df = e["df"]
+            cols = ", ".join(f"{c} {_sqlite_type(df[c])}" for c in df.columns)
+            blocks.append(
+                f"Table {e['table']} ({e['rows']} rows) — answer to: \"{e['question']}\"\n"
+                f"Built with SQL:\n{e['sql']}\n"
+                f"Columns: {cols}\n"
+                f"Sample:\n{df.head(sample_rows).to_string(index=False)}")
+        return "\n\n".join(blocks)
+
+    def query(self, sql: str) -> pd.DataFrame:
+        """Выполняет SELECT по кэшированным фреймам в in-memory SQLite.
+        Загружаются только таблицы rN, упомянутые в запросе."""
+        if not sql.lstrip().lower().startswith(("select", "with")):
+            raise ValueError("only SELECT queries run against cached results")
+        used = {t.lower() for t in re.findall(r"\br\d+\b", sql, re.IGNORECASE)}
+        conn = sqlite3.connect(":memory:")
+        try:
+            for e in self.cached():
+                if e["table"] in used:
+                    e["df"].to_sql(e["table"], conn, index=False)
+            return pd.read_sql_query(sql, conn)
+        finally:
+            conn.close()
+
+
+def _unique_columns(columns) -> list:
+    """x, x, y -> x, x_2, y (регистр не важен — как в SQLite)"""
+    seen, out = set(), []
+    for c in map(str, columns):
+        name, n = c, 1
+        while name.lower() in seen:
+            n += 1
+            name = f"{c}_{n}"
+        seen.add(name.lower())
+        out.append(name)
+    return out
+
+
+def _sqlite_type(series: pd.Series) -> str:
+    if pd.api.types.is_integer_dtype(series):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(series):
+        return "REAL"
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return "TIMESTAMP"
+    return "TEXT"
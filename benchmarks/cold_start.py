@@ -0,0 +1,114 @@
+"""
+Бенчмарк холодного старта: от запуска процесса до первой отрисовки.
+
+    python -m benchmarks.cold_start                  # без БД: до заголовка страницы
+    python -m benchmarks.cold_start --runs 10 --database-url postgresql://...
+
+Каждый прогон — новый процесс Python, который исполняет app.py через
+streamlit.testing (без HTTP-сервера и браузера). Этапы берутся из
+perf.milestone():
+  imports          — модуль app.py импортирован
+  first_paint      — заголовок страницы отрисован
+  first_data_paint — KPI отрисованы (только с доступной БД)
+  script_end       — скрипт отработал целиком
+Плюс разбивка времени импорта по пакетам (STARTUP_PROFILE=1).
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+RESULTS_DIR = os.path.join(HERE, "results")
+
+CHILD = """
+import json, sys
+sys.path.insert(0, {root!r})
+import perf  # до streamlit, чтобы профилировать все импорты
+from streamlit.testing.v1 import AppTest
+AppTest.from_file({app!r}, default_timeout={timeout}).run()
+print("@@startup " + json.dumps(perf.startup_report()))
+"""
+
+
+def run_once(database_url: str, timeout: int) -> dict:
+    env = dict(os.environ, STARTUP_PROFILE="1", STREAMLIT_LOGGER_LEVEL="error")
+    if database_url:
+        env["DATABASE_URL"] = database_url
+    else:
+        # Недоступная БД: соединение отклоняется сразу, меряем только старт
+        env.pop("DATABASE_URL", None)
+        env.update(DB_HOST="127.0.0.1", DB_PORT="9")
+    code = CHILD.format(root=ROOT, app=os.path.join(ROOT, "app.py"), timeout=timeout)
+    env["STARTUP_T0"] = repr(time.time())
+    t0 = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", code], env=env, cwd=ROOT,
+                         capture_output=True, text=True, timeout=timeout + 30)
+    wall = time.perf_counter() - t0
+    line = next((l for l in out.stdout.splitlines() if l.startswith("@@startup ")), None)
+    if line is None:
+        raise RuntimeError(f"cold start run failed:\n{out.stderr[-2000:]}")
+    report = json.loads(line[len("@@startup "):])
+    report["process_exit_ms"] = round(wall * 1000, 1)
+    return report
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--runs", type=int, default=5)
+    p.add_argument("--database-url", help="real DB to also measure first_data_paint")
+    p.add_argument("--timeout", type=int, default=120)
+    p.add_argument("--out", help="result JSON path (default benchmarks/results/cold_start-<timestamp>.json)")
+    args = p.parse_args(argv)
+
+    runs = []
+    for i in range(args.runs):
+        r = run_once(args.database_url, args.timeout)
+        runs.append(r)
+        ms = r["milestones_ms"]
+        print(f"  run {i+1}: first_paint {ms.get('first_paint', float('nan')):8.1f} ms · "
+              f"script_end {ms.get('script_end', float('nan')):8.1f} ms")
+
+    milestones = {}
+    for name in runs[0]["milestones_ms"]:
+        values = [r["milestones_ms"][name] for r in runs if name in r["milestones_ms"]]
+        milestones[name] = round(statistics.median(values), 1)
+    imports = {}
+    for r in runs:
+        for name, ms in r["imports_ms"].items():
+            imports.setdefault(name, []).append(ms)
+    imports = dict(sorted(((k, round(statistics.median(v), 1)) for k, v in imports.items()),
+                          key=lambda kv: -kv[1]))
+
+    print("\nmedian milestones (ms from process start)")
+    for name, ms in milestones.items():
+        print(f"  {name:<18} {ms:>8.1f}")
+    print("\nimport time by package (ms, top 12)")
+    for name, ms in list(imports.items())[:12]:
+        print(f"  {name:<18} {ms:>8.1f}")
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "with_db": bool(args.database_url),
+        "milestones_ms": milestones,
+        "imports_ms": imports,
+        "raw": runs,
+    }
+    out = args.out or os.path.join(RESULTS_DIR, datetime.now().strftime("cold_start-%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nsaved {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
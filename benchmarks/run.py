@@ -0,0 +1,214 @@
+"""
+Бенчмарки путей данных и рендера дашборда на синтетических данных.
+
+    python -m benchmarks.run                                  # быстрый прогон
+    python -m benchmarks.run --asins 1000,10000,100000 --days 7,30,90,365
+    python -m benchmarks.run --compare benchmarks/results/baseline.json
+
+Каждая комбинация ASIN × дни генерируется один раз (кэш в benchmarks/.data),
+функции app.py вызываются напрямую с пустым st.cache, LLM подменяется
+заглушкой. Результаты пишутся в JSON для сравнения между коммитами.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+from sqlalchemy import text
+
+from benchmarks.synthetic import build_sqlite, sqlite_engine
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(HERE, ".data")
+RESULTS_DIR = os.path.join(HERE, "results")
+
+STUB_SQL = """SELECT child_asin, SUM(ordered_product_sales) AS sales,
+       SUM(units_ordered) AS units, AVG(buy_box_percentage) AS buybox
+FROM spapi.sales_traffic_report
+WHERE date >= '{date_from}'
+GROUP BY child_asin
+ORDER BY sales DESC
+LIMIT 50"""
+
+
+def dataset(n_asins: int, days: int, seed: int, rebuild: bool = False) -> str:
+    os.makedirs(DATA_DIR, exist_ok=True)
+    # Значения зависят только от размера и seed; даты привязаны к сегодня,
+    # поэтому вчерашний файл пересобирается (с теми же значениями)
+    path = os.path.join(DATA_DIR, f"str_{n_asins}x{days}_s{seed}.db")
+    if rebuild or not os.path.exists(path) or last_date(path) != date.today().isoformat():
+        t0 = time.perf_counter()
+        rows = build_sqlite(path, n_asins, days, seed=seed)
+        print(f"  generated {rows:,} rows in {time.perf_counter() - t0:.1f}s -> {path}")
+    return path
+
+
+def last_date(path: str) -> str:
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT MAX(date) FROM sales_traffic_report").fetchone()[0]
+
+
+def timeit(fn, repeat: int) -> dict:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return {
+        "min_ms": round(min(times) * 1000, 3),
+        "median_ms": round(statistics.median(times) * 1000, 3),
+        "mean_ms": round(statistics.fmean(times) * 1000, 3),
+        "repeat": repeat,
+    }
+
+
+def bench_scale(app, path: str, n_asins: int, days: int, repeat: int, llm_latency: float) -> dict:
+    engine = sqlite_engine(path)
+    app.get_engine = lambda: engine
+    T = app.TRANSLATIONS["EN"]
+    theme = app.DARK_THEME
+
+    def load_cold():
+        app.load_data.clear()
+        return app.load_data(days, "All")
+
+    def asins_cold():
+        app.load_asin_list.clear()
+        return app.load_asin_list()
+
+    df = load_cold()
+    top_asin = df.groupby("child_asin")["ordered_product_sales"].sum().idxmax()
+
+    def load_one_asin():
+        app.load_data.clear()
+        return app.load_data(days, top_asin)
+
+    date_from = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+
+    def fake_gemini(prompt):
+        if llm_latency:
+            time.sleep(llm_latency)
+        if "PostgreSQL expert" in prompt:
+            return STUB_SQL.format(date_from=date_from), "stub"
+        return "- stub analysis", "stub"
+
+    app.call_gemini = fake_gemini
+
+    def ai_pipeline():
+        sql = app.ai_generate_sql("Top ASINs by sales?", "EN", days)
+        with engine.connect() as conn:
+            result = pd.read_sql(text(sql), conn)
+        return app.ai_analyze_results("Top ASINs by sales?", sql, result, "EN")
+
+    cases = {
+        "load_data": load_cold,
+        "load_data_single_asin": load_one_asin,
+        "load_asin_list": asins_cold,
+        "kpi_row": lambda: app.kpi_row(df, T),
+        "chart_sales_sessions": lambda: app.chart_sales_sessions(df, T, theme),
+        "chart_top_asins": lambda: app.chart_top_asins(df, T, theme),
+        "chart_traffic_split": lambda: app.chart_traffic_split(df, T, theme),
+        "chart_b2b": lambda: app.chart_b2b(df, T, theme),
+        "table_detail": lambda: app.table_detail(df, T),
+        "build_data_summary": lambda: app.build_data_summary(df, "EN"),
+        "ai_pipeline": ai_pipeline,
+    }
+    out = {"asins": n_asins, "days": days, "rows": len(df),
+           "frame_bytes": int(df.memory_usage(deep=True).sum()), "cases": {}}
+    for name, fn in cases.items():
+        out["cases"][name] = timeit(fn, repeat)
+        print(f"  {name:<24} {out['cases'][name]['median_ms']:>10.1f} ms")
+    return out
+
+
+def compare(current: dict, baseline_path: str, threshold: float) -> int:
+    """Печатает изменения медиан; возвращает число регрессий сверх порога"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    base = {(r["asins"], r["days"]): r for r in baseline["results"]}
+    regressions = 0
+    print(f"\nvs {baseline_path} (threshold {threshold:.0%})")
+    for r in current["results"]:
+        b = base.get((r["asins"], r["days"]))
+        if not b:
+            continue
+        for name, stats in r["cases"].items():
+            if name not in b["cases"]:
+                continue
+            old, new = b["cases"][name]["median_ms"], stats["median_ms"]
+            delta = (new - old) / old if old else 0.0
+            flag = ""
+            if delta > threshold:
+                flag = "  REGRESSION"
+                regressions += 1
+            print(f"  {r['asins']:>7}x{r['days']:<4} {name:<24} {old:>10.1f} -> {new:>10.1f} ms ({delta:+.1%}){flag}")
+    return regressions
+
+
+def git_rev() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=HERE, text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return ""
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--asins", default="1000", help="ASIN counts, comma separated (e.g. 1000,10000,100000)")
+    p.add_argument("--days", default="7,30", help="day windows, comma separated (7..365)")
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--llm-latency", type=float, default=0.0, help="seconds the stub LLM sleeps per call")
+    p.add_argument("--rebuild", action="store_true", help="regenerate cached synthetic data")
+    p.add_argument("--out", help="result JSON path (default benchmarks/results/<timestamp>.json)")
+    p.add_argument("--compare", help="baseline JSON to compare against")
+    p.add_argument("--threshold", type=float, default=0.10, help="regression threshold for --compare")
+    args = p.parse_args(argv)
+
+    sys.path.insert(0, os.path.dirname(HERE))
+    # Bare mode пишет "missing ScriptRunContext" на каждый st.* вызов.
+    # Streamlit выставляет уровень логов при первом чтении конфига, поэтому
+    # сначала читаем конфиг, потом понижаем уровень.
+    import streamlit.config
+    import streamlit.logger
+    streamlit.config.get_option("logger.level")
+    streamlit.logger.set_log_level("error")
+    import app
+
+    results = []
+    for n_asins in [int(x) for x in args.asins.split(",")]:
+        for days in [int(x) for x in args.days.split(",")]:
+            print(f"\n== {n_asins:,} ASINs x {days} days")
+            path = dataset(n_asins, days, args.seed, args.rebuild)
+            results.append(bench_scale(app, path, n_asins, days, args.repeat, args.llm_latency))
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git": git_rev(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "results": results,
+    }
+    out = args.out or os.path.join(RESULTS_DIR, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nsaved {out}")
+
+    if args.compare:
+        return 1 if compare(report, args.compare, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
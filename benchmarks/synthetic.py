@@ -0,0 +1,187 @@
+"""
+Синтетический spapi.sales_traffic_report для бенчмарков.
+
+Генерирует N ASIN × D дней с реалистичным перекосом:
+  - популярность ASIN по Zipf — несколько бестселлеров и длинный хвост
+    с полом TAIL_SESSIONS, чтобы число строк росло линейно с числом ASIN;
+  - семейства parent/child (1–8 вариаций на parent);
+  - недельная сезонность и медленный тренд (от номера дня, а не от даты —
+    значения при том же seed одинаковы в любой день, сдвигаются только даты);
+  - B2B есть примерно у b2b_share ASIN, и там это 5–30% продаж;
+  - строки без сессий и продаж не пишутся, как в отчёте SP-API.
+
+Данные пишутся в SQLite, прикреплённую как схема `spapi`, поэтому SQL
+дашборда работает без изменений.
+"""
+
+import os
+import sqlite3
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, event
+
+TABLE_NAME = "sales_traffic_report"
+
+COLUMNS = [
+    "date", "parent_asin", "child_asin", "title", "sku",
+    "sessions", "sessions_b2b", "browser_sessions", "mobile_app_sessions", "session_percentage",
+    "page_views", "page_views_b2b", "browser_page_views", "mobile_app_page_views", "page_views_percentage",
+    "buy_box_percentage", "buy_box_percentage_b2b",
+    "unit_session_percentage", "unit_session_percentage_b2b",
+    "units_ordered", "units_ordered_b2b",
+    "ordered_product_sales", "ordered_product_sales_b2b",
+    "total_order_items", "total_order_items_b2b",
+]
+
+DDL = f"""
+CREATE TABLE IF NOT EXISTS spapi.{TABLE_NAME} (
+    date TEXT, parent_asin TEXT, child_asin TEXT, title TEXT, sku TEXT,
+    sessions INTEGER, sessions_b2b INTEGER, browser_sessions INTEGER, mobile_app_sessions INTEGER,
+    session_percentage REAL,
+    page_views INTEGER, page_views_b2b INTEGER, browser_page_views INTEGER, mobile_app_page_views INTEGER,
+    page_views_percentage REAL,
+    buy_box_percentage REAL, buy_box_percentage_b2b REAL,
+    unit_session_percentage REAL, unit_session_percentage_b2b REAL,
+    units_ordered INTEGER, units_ordered_b2b INTEGER,
+    ordered_product_sales REAL, ordered_product_sales_b2b REAL,
+    total_order_items INTEGER, total_order_items_b2b INTEGER
+)
+"""
+
+# Минимум ожидаемых сессий/день у ASIN из хвоста: Poisson(2) > 0 в ~86% дней
+TAIL_SESSIONS = 2.0
+
+TITLE_WORDS = ["Brake", "Pad", "Rotor", "Filter", "Sensor", "Kit", "Pump", "Hose",
+               "Clamp", "Bearing", "Gasket", "Mount", "Valve", "Switch", "Relay"]
+
+
+def make_catalog(n_asins: int, b2b_share: float = 0.3, seed: int = 42) -> pd.DataFrame:
+    """Справочник ASIN: семейства, популярность, цена, доля B2B"""
+    rng = np.random.default_rng(seed)
+    family_sizes = []
+    while sum(family_sizes) < n_asins:
+        family_sizes.append(int(rng.integers(1, 9)))
+    family_sizes[-1] -= sum(family_sizes) - n_asins
+    parents = np.repeat(np.arange(len(family_sizes)), family_sizes)
+
+    ranks = rng.permutation(n_asins) + 1
+    popularity = 1.0 / ranks ** 1.1
+    popularity = popularity / popularity.max() * 4000   # сессий/день у бестселлера
+    # Пол для хвоста: без него при 100k ASIN почти все дни с нулём сессий
+    # отбрасываются и строк всего в ~7 раз больше, чем при 1k. С полом почти
+    # каждый ASIN активен, и объём растёт пропорционально числу ASIN.
+    popularity = np.maximum(popularity, TAIL_SESSIONS)
+
+    has_b2b = rng.random(n_asins) < b2b_share
+    words = rng.integers(0, len(TITLE_WORDS), size=(n_asins, 3))
+    return pd.DataFrame({
+        "parent_asin": [f"B0P{p:07d}" for p in parents],
+        "child_asin": [f"B0C{i:07d}" for i in range(n_asins)],
+        "title": [" ".join(TITLE_WORDS[w] for w in ws) + f" #{i}" for i, ws in enumerate(words)],
+        "sku": [f"SKU-{i:06d}" for i in range(n_asins)],
+        "popularity": popularity,
+        "price": np.round(rng.lognormal(mean=3.2, sigma=0.6, size=n_asins), 2),
+        "cvr": np.clip(rng.beta(2, 18, size=n_asins), 0.005, 0.6),
+        "mobile_share": rng.beta(6, 4, size=n_asins),
+        "b2b_share": np.where(has_b2b, rng.uniform(0.05, 0.30, size=n_asins), 0.0),
+    })
+
+
+def iter_days(catalog: pd.DataFrame, days: int, end: date = None, seed: int = 42):
+    """Отдаёт по одному DataFrame на день, от самого старого к сегодня"""
+    rng = np.random.default_rng(seed + 1)
+    end = end or date.today()
+    pop = catalog["popularity"].to_numpy()
+    cvr = catalog["cvr"].to_numpy()
+    price = catalog["price"].to_numpy()
+    mob = catalog["mobile_share"].to_numpy()
+    b2b = catalog["b2b_share"].to_numpy()
+
+    for d in range(days - 1, -1, -1):
+        day = end - timedelta(days=d)
+        # Сезонность — от номера дня в выборке, а не от дня недели:
+        # при том же seed данные не меняются в зависимости от сегодняшней даты
+        i = days - 1 - d
+        factor = (1.0 + 0.15 * np.sin(2 * np.pi * (i % 7) / 7)) * (1.0 + 0.002 * (i + 1))
+        sessions = rng.poisson(pop * factor)
+        keep = sessions > 0
+        if not keep.any():
+            continue
+        s = sessions[keep]
+        units = rng.binomial(s, cvr[keep])
+        units_b2b = rng.binomial(units, b2b[keep])
+        sessions_b2b = rng.binomial(s, b2b[keep])
+        mobile = rng.binomial(s, mob[keep])
+        pv = (s * rng.uniform(1.1, 1.9, size=len(s))).astype(np.int64)
+        pv_mobile = rng.binomial(pv, mob[keep])
+        pv_b2b = rng.binomial(pv, b2b[keep])
+        buybox = np.clip(rng.normal(94, 8, size=len(s)), 0, 100).round(2)
+
+        cat = catalog.loc[keep]
+        yield pd.DataFrame({
+            "date": day.isoformat(),
+            "parent_asin": cat["parent_asin"].to_numpy(),
+            "child_asin": cat["child_asin"].to_numpy(),
+            "title": cat["title"].to_numpy(),
+            "sku": cat["sku"].to_numpy(),
+            "sessions": s,
+            "sessions_b2b": sessions_b2b,
+            "browser_sessions": s - mobile,
+            "mobile_app_sessions": mobile,
+            "session_percentage": (s / s.sum() * 100).round(4),
+            "page_views": pv,
+            "page_views_b2b": pv_b2b,
+            "browser_page_views": pv - pv_mobile,
+            "mobile_app_page_views": pv_mobile,
+            "page_views_percentage": (pv / max(pv.sum(), 1) * 100).round(4),
+            "buy_box_percentage": buybox,
+            "buy_box_percentage_b2b": np.where(sessions_b2b > 0, buybox, 0.0),
+            "unit_session_percentage": (units / s * 100).round(2),
+            "unit_session_percentage_b2b": np.where(sessions_b2b > 0,
+                (units_b2b / np.maximum(sessions_b2b, 1) * 100).round(2), 0.0),
+            "units_ordered": units,
+            "units_ordered_b2b": units_b2b,
+            "ordered_product_sales": (units * price[keep]).round(2),
+            "ordered_product_sales_b2b": (units_b2b * price[keep]).round(2),
+            "total_order_items": units,
+            "total_order_items_b2b": units_b2b,
+        }, columns=COLUMNS)
+
+
+def build_sqlite(path: str, n_asins: int, days: int, b2b_share: float = 0.3,
+                 seed: int = 42, index: bool = True) -> int:
+    """Пишет синтетику в файл SQLite (схема spapi). Возвращает число строк."""
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(":memory:")
+    conn.execute("ATTACH DATABASE ? AS spapi", (path,))
+    conn.execute("PRAGMA spapi.journal_mode=OFF")
+    conn.execute("PRAGMA spapi.synchronous=OFF")
+    conn.execute(DDL)
+    placeholders = ",".join("?" * len(COLUMNS))
+    total = 0
+    catalog = make_catalog(n_asins, b2b_share, seed)
+    for chunk in iter_days(catalog, days, seed=seed):
+        conn.executemany(
+            f"INSERT INTO spapi.{TABLE_NAME} VALUES ({placeholders})",
+            chunk.itertuples(index=False, name=None))
+        total += len(chunk)
+    if index:
+        conn.execute(f"CREATE INDEX spapi.ix_str_date_asin ON {TABLE_NAME} (date, child_asin)")
+    conn.execute("ANALYZE spapi")
+    conn.commit()
+    conn.close()
+    return total
+
+
+def sqlite_engine(path: str):
+    """Engine, у которого spapi.sales_traffic_report указывает на файл path"""
+    engine = create_engine("sqlite://")
+
+    @event.listens_for(engine, "connect")
+    def _attach(dbapi_conn, _):
+        dbapi_conn.execute("ATTACH DATABASE ? AS spapi", (path,))
+
+    return engine
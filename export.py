@@ -0,0 +1,196 @@
+"""
+Потоковая выгрузка детальных данных в Parquet / CSV / XLSX.
+
+Строки читаются server-side курсором (stream_results) пачками по CHUNK_ROWS
+и сразу пишутся в файл — полный DataFrame в памяти не собирается.
+Выгрузка идёт в фоновом потоке; состояние — в объекте Job, который UI
+опрашивает для прогресса и ссылки на скачивание.
+"""
+
+import csv
+import importlib.util
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+from sqlalchemy import text
+
+FORMATS = {
+    "parquet": ("application/vnd.apache.parquet", ".parquet"),
+    "csv": ("text/csv", ".csv"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", ".xlsx"),
+}
+
+# Библиотеки писателей: в requirements.txt, но форматы без них просто скрываются
+REQUIRES = {"parquet": "pyarrow", "xlsx": "openpyxl"}
+
+CHUNK_ROWS = 20_000
+XLSX_MAX_ROWS = 1_048_575        # лимит листа Excel минус заголовок
+JOB_TTL = 3600                   # файлы готовых выгрузок живут час
+EXPORT_DIR = os.getenv("EXPORT_DIR") or os.path.join(tempfile.gettempdir(), "dashboard_exports")
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+class Job:
+    def __init__(self, fmt: str, file_name: str):
+        self.id = uuid.uuid4().hex
+        self.fmt = fmt
+        self.file_name = file_name
+        self.path = os.path.join(EXPORT_DIR, self.id + FORMATS[fmt][1])
+        self.mime = FORMATS[fmt][0]
+        self.status = "running"
+        self.rows = 0
+        self.total = None
+        self.error = None
+        self.started = time.time()
+        self.finished = None
+
+    @property
+    def progress(self) -> float:
+        if self.status == "done":
+            return 1.0
+        if not self.total:
+            return 0.0
+        return min(self.rows / self.total, 0.99)
+
+    @property
+    def size(self) -> int:
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+
+def available_formats() -> list:
+    """Форматы, для которых установлена библиотека писателя"""
+    return [fmt for fmt in FORMATS
+            if fmt not in REQUIRES or importlib.util.find_spec(REQUIRES[fmt]) is not None]
+
+
+def get(job_id: str):
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+
+def start(engine, query: str, params: dict, fmt: str, file_name: str,
+          count_query: str = None, types: dict = None) -> Job:
+    """Запускает выгрузку в фоне и сразу возвращает Job.
+    count_query — тот же запрос без ORDER BY, для прогресса.
+    types — колонка -> "date" | "string" | "int" | "float" (для схемы Parquet)."""
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown export format: {fmt}")
+    if fmt not in available_formats():
+        raise ValueError(f"{fmt} export needs {REQUIRES[fmt]} (see requirements.txt)")
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    _cleanup()
+    job = Job(fmt, file_name)
+    with _jobs_lock:
+        _jobs[job.id] = job
+    count_query = count_query or f"SELECT COUNT(*) FROM ({query}) q"
+    threading.Thread(target=_run, args=(job, engine, query, count_query, params, types or {}),
+                     name=f"export-{job.id[:8]}", daemon=True).start()
+    return job
+
+
+def _cleanup():
+    now = time.time()
+    with _jobs_lock:
+        stale = [j for j in _jobs.values() if j.finished and now - j.finished > JOB_TTL]
+        for job in stale:
+            _jobs.pop(job.id, None)
+    for job in stale:
+        try:
+            os.remove(job.path)
+        except OSError:
+            pass
+
+
+def _run(job: Job, engine, query: str, count_query: str, params: dict, types: dict):
+    try:
+        with engine.connect() as conn:
+            job.total = conn.execute(text(count_query), params).scalar()
+        with engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, max_row_buffer=CHUNK_ROWS) \
+                .execute(text(query), params)
+            columns = list(result.keys())
+            chunks = result.partitions(CHUNK_ROWS)
+            WRITERS[job.fmt](job, columns, chunks, types)
+        job.status = "done"
+    except Exception as e:
+        job.status = "error"
+        job.error = str(e)
+        try:
+            os.remove(job.path)
+        except OSError:
+            pass
+    finally:
+        job.finished = time.time()
+
+
+def _write_csv(job: Job, columns: list, chunks, types: dict):
+    # utf-8-sig — чтобы Excel правильно открыл кириллицу в названиях
+    with open(job.path, "w", newline="", encoding="utf-8-sig") as f:
+        w = csv.writer(f)
+        w.writerow(columns)
+        for rows in chunks:
+            w.writerows(rows)
+            job.rows += len(rows)
+
+
+def _write_parquet(job: Job, columns: list, chunks, types: dict):
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    arrow_types = {"date": pa.date32(), "string": pa.string(),
+                   "int": pa.int64(), "float": pa.float64()}
+    # Схема — из известных типов колонок, а не из первой пачки: колонка,
+    # пустая в свежих датах, иначе типизировалась бы как string для всего файла.
+    # Неизвестные колонки — как раньше, по первой пачке.
+    known = {c: arrow_types[types[c]] for c in columns if c in types}
+    writer = schema = None
+    try:
+        for rows in chunks:
+            # NUMERIC -> float, как делает pd.read_sql в дашборде
+            df = pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+            if schema is None:
+                inferred = pa.Table.from_pandas(df, preserve_index=False).schema
+                schema = pa.schema([
+                    pa.field(c, known.get(c) or (pa.string() if pa.types.is_null(f.type) else f.type))
+                    for c, f in zip(columns, inferred)])
+                writer = pq.ParquetWriter(job.path, schema, compression="zstd")
+            batch = pa.Table.from_arrays(
+                [pa.array(df[c], from_pandas=True).cast(f.type) for c, f in zip(columns, schema)],
+                schema=schema)
+            writer.write_table(batch)
+            job.rows += len(rows)
+        if writer is None:
+            schema = pa.schema([pa.field(c, known.get(c, pa.string())) for c in columns])
+            pq.write_table(schema.empty_table(), job.path)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def _write_xlsx(job: Job, columns: list, chunks, types: dict):
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws, sheet_rows, sheet_no = None, XLSX_MAX_ROWS, 0
+    for rows in chunks:
+        for r in rows:
+            if sheet_rows >= XLSX_MAX_ROWS:
+                sheet_no += 1
+                ws = wb.create_sheet(f"data_{sheet_no}" if sheet_no > 1 else "data")
+                ws.append(columns)
+                sheet_rows = 0
+            ws.append(list(r))
+            sheet_rows += 1
+        job.rows += len(rows)
+    if ws is None:
+        wb.create_sheet("data").append(columns)
+    wb.save(job.path)
+
+
+WRITERS = {"csv": _write_csv, "parquet": _write_parquet, "xlsx": _write_xlsx}
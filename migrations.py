@@ -0,0 +1,349 @@
+"""
+Индексы и rollup-таблицы для spapi.sales_traffic_report.
+
+    python migrations.py apply [--brin]     # создать индексы и rollup-таблицы
+    python migrations.py refresh --days 3   # пересчитать rollup за последние дни
+    python migrations.py verify             # проверить, что всё на месте и свежее
+    python migrations.py check              # EXPLAIN запросов дашборда
+
+refresh запускать после каждой загрузки отчёта (ingestion): пересчитываются
+только затронутые даты, а не вся история.
+
+sales_traffic_asin_daily читает дашборд (список ASIN). sales_traffic_daily
+дашборд не читает: графики строятся из уже загруженных детальных строк, и
+отдельный запрос ничего бы не сэкономил. Это дневные итоги по всем ASIN для
+внешних отчётов/BI и ручного SQL — одна строка на день вместо полного прохода.
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+
+TABLE = "spapi.sales_traffic_report"
+DAILY = "spapi.sales_traffic_daily"
+ASIN_DAILY = "spapi.sales_traffic_asin_daily"
+
+# Таблица, на которой seq scan считаем проблемой (меньше — Postgres прав)
+SEQ_SCAN_MIN_ROWS = 50_000
+# При индексах на месте seq scan — проблема, только если план ждёт меньше
+# этой доли строк таблицы. Для 60–90 дней из истории полный проход — верный выбор.
+SEQ_SCAN_MAX_SHARE = 0.05
+
+INDEXES = {
+    "ix_str_date_child_asin": f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_str_date_child_asin "
+                              f"ON {TABLE} (date, child_asin)",
+    "ix_str_child_asin_date": f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_str_child_asin_date "
+                              f"ON {TABLE} (child_asin, date)",
+}
+# BRIN на date — для больших append-only таблиц вместо btree, на порядки меньше
+BRIN_INDEX = ("ix_str_date_brin",
+              f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_str_date_brin ON {TABLE} USING brin (date)")
+
+ROLLUP_DDL = [
+    f"""CREATE TABLE IF NOT EXISTS {DAILY} (
+        date DATE PRIMARY KEY,
+        asin_count INT NOT NULL,
+        row_count INT NOT NULL,
+        sessions BIGINT, sessions_b2b BIGINT,
+        browser_sessions BIGINT, mobile_app_sessions BIGINT,
+        page_views BIGINT, page_views_b2b BIGINT,
+        browser_page_views BIGINT, mobile_app_page_views BIGINT,
+        units_ordered BIGINT, units_ordered_b2b BIGINT,
+        ordered_product_sales NUMERIC, ordered_product_sales_b2b NUMERIC,
+        total_order_items BIGINT, total_order_items_b2b BIGINT,
+        unit_session_percentage_sum NUMERIC,
+        buy_box_percentage_sum NUMERIC,
+        refreshed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )""",
+    f"""CREATE TABLE IF NOT EXISTS {ASIN_DAILY} (
+        child_asin TEXT NOT NULL,
+        date DATE NOT NULL,
+        parent_asin TEXT, title TEXT, sku TEXT,
+        row_count INT NOT NULL,
+        sessions BIGINT, sessions_b2b BIGINT,
+        page_views BIGINT, page_views_b2b BIGINT,
+        units_ordered BIGINT, units_ordered_b2b BIGINT,
+        ordered_product_sales NUMERIC, ordered_product_sales_b2b NUMERIC,
+        unit_session_percentage_sum NUMERIC,
+        buy_box_percentage_sum NUMERIC,
+        refreshed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        PRIMARY KEY (child_asin, date)
+    )""",
+    f"CREATE INDEX IF NOT EXISTS ix_str_asin_daily_date ON {ASIN_DAILY} (date)",
+]
+
+# Средние CVR / Buy Box храним как сумму + row_count, чтобы
+# AVG по любому окну совпадал с тем, что считает дашборд по сырым строкам.
+REFRESH_SQL = [
+    f"DELETE FROM {DAILY} WHERE date >= :since",
+    f"""INSERT INTO {DAILY} (date, asin_count, row_count,
+            sessions, sessions_b2b, browser_sessions, mobile_app_sessions,
+            page_views, page_views_b2b, browser_page_views, mobile_app_page_views,
+            units_ordered, units_ordered_b2b,
+            ordered_product_sales, ordered_product_sales_b2b,
+            total_order_items, total_order_items_b2b,
+            unit_session_percentage_sum, buy_box_percentage_sum)
+        SELECT date, COUNT(DISTINCT child_asin), COUNT(*),
+            SUM(sessions), SUM(sessions_b2b), SUM(browser_sessions), SUM(mobile_app_sessions),
+            SUM(page_views), SUM(page_views_b2b), SUM(browser_page_views), SUM(mobile_app_page_views),
+            SUM(units_ordered), SUM(units_ordered_b2b),
+            SUM(ordered_product_sales), SUM(ordered_product_sales_b2b),
+            SUM(total_order_items), SUM(total_order_items_b2b),
+            SUM(unit_session_percentage), SUM(buy_box_percentage)
+        FROM {TABLE}
+        WHERE date >= :since
+        GROUP BY date""",
+    f"DELETE FROM {ASIN_DAILY} WHERE date >= :since",
+    f"""INSERT INTO {ASIN_DAILY} (child_asin, date, parent_asin, title, sku, row_count,
+            sessions, sessions_b2b, page_views, page_views_b2b,
+            units_ordered, units_ordered_b2b,
+            ordered_product_sales, ordered_product_sales_b2b,
+            unit_session_percentage_sum, buy_box_percentage_sum)
+        SELECT child_asin, date, MIN(parent_asin), MIN(title), MIN(sku), COUNT(*),
+            SUM(sessions), SUM(sessions_b2b), SUM(page_views), SUM(page_views_b2b),
+            SUM(units_ordered), SUM(units_ordered_b2b),
+            SUM(ordered_product_sales), SUM(ordered_product_sales_b2b),
+            SUM(unit_session_percentage), SUM(buy_box_percentage)
+        FROM {TABLE}
+        WHERE date >= :since AND child_asin IS NOT NULL
+        GROUP BY child_asin, date""",
+]
+
+# Loose index scan: DISTINCT child_asin за O(число ASIN) обращений к PK,
+# а не полный проход по таблице. Плюс ASIN из базовой таблицы за даты новее
+# rollup (по индексу date, child_asin) — если refresh после загрузки не
+# запустили, новые ASIN не пропадают из списка; пустой rollup = полный DISTINCT.
+ASIN_LIST_SQL = f"""
+    WITH RECURSIVE a AS (
+        (SELECT child_asin FROM {ASIN_DAILY} ORDER BY child_asin LIMIT 1)
+        UNION ALL
+        SELECT (SELECT r.child_asin FROM {ASIN_DAILY} r
+                WHERE r.child_asin > a.child_asin ORDER BY r.child_asin LIMIT 1)
+        FROM a WHERE a.child_asin IS NOT NULL
+    )
+    SELECT child_asin FROM a WHERE child_asin IS NOT NULL
+    UNION
+    SELECT DISTINCT child_asin FROM {TABLE}
+    WHERE date > COALESCE((SELECT MAX(date) FROM {ASIN_DAILY}), DATE '1900-01-01')
+      AND child_asin IS NOT NULL
+    ORDER BY child_asin
+"""
+
+
+def engine_from_env():
+    db_url = os.getenv("DATABASE_URL") or (
+        f"postgresql://{os.getenv('DB_USER','postgres')}:"
+        f"{os.getenv('DB_PASSWORD','')}@"
+        f"{os.getenv('DB_HOST','localhost')}:"
+        f"{os.getenv('DB_PORT','5432')}/"
+        f"{os.getenv('DB_NAME','amazon')}"
+    )
+    if "sslmode" not in db_url:
+        db_url += "?sslmode=require"
+    return create_engine(db_url)
+
+
+INDEX_STATE_SQL = """
+    SELECT c.relname, i.indisvalid
+    FROM pg_index i
+    JOIN pg_class c ON c.oid = i.indexrelid
+    JOIN pg_class t ON t.oid = i.indrelid
+    JOIN pg_namespace n ON n.oid = t.relnamespace
+    WHERE n.nspname = 'spapi' AND t.relname = 'sales_traffic_report'
+"""
+
+
+def index_state(conn) -> dict:
+    """{имя индекса: valid} для индексов базовой таблицы.
+    Упавший CREATE INDEX CONCURRENTLY оставляет индекс с indisvalid = false."""
+    return {name: valid for name, valid in conn.execute(text(INDEX_STATE_SQL))}
+
+
+def apply(engine, brin: bool = False) -> list:
+    """Создаёт индексы и rollup-таблицы. Идемпотентно.
+    Пустые rollup заполняются за всю историю."""
+    done = []
+    with engine.begin() as conn:
+        for ddl in ROLLUP_DDL:
+            conn.execute(text(ddl))
+        empty = conn.execute(text(f"SELECT NOT EXISTS (SELECT 1 FROM {DAILY})")).scalar()
+    done += [DAILY, ASIN_DAILY]
+    if empty:
+        refresh_rollups(engine, "1900-01-01")
+        done.append("rollup backfill")
+
+    # CREATE INDEX CONCURRENTLY не работает внутри транзакции
+    indexes = dict(INDEXES)
+    if brin:
+        indexes[BRIN_INDEX[0]] = BRIN_INDEX[1]
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        state = index_state(conn)
+        for name, ddl in indexes.items():
+            # IF NOT EXISTS пропустил бы невалидный остаток прошлой попытки
+            if state.get(name) is False:
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS spapi.{name}"))
+                done.append(f"{name} (dropped invalid)")
+            conn.execute(text(ddl))
+            done.append(name)
+        conn.execute(text(f"ANALYZE {TABLE}"))
+    return done
+
+
+def refresh_rollups(engine, since: str) -> None:
+    """Пересчитывает rollup для дат >= since (YYYY-MM-DD) одной транзакцией"""
+    with engine.begin() as conn:
+        for sql in REFRESH_SQL:
+            conn.execute(text(sql), {"since": since})
+        conn.execute(text(f"ANALYZE {DAILY}"))
+        conn.execute(text(f"ANALYZE {ASIN_DAILY}"))
+
+
+def rollups_ready(conn) -> bool:
+    """Есть ли rollup-таблицы в этой БД"""
+    if conn.dialect.name != "postgresql":
+        return False
+    row = conn.execute(text(
+        "SELECT to_regclass(:a) IS NOT NULL AND to_regclass(:b) IS NOT NULL"),
+        {"a": DAILY, "b": ASIN_DAILY}).scalar()
+    return bool(row)
+
+
+def verify(engine) -> list:
+    """Список проблем: отсутствующие или невалидные индексы, таблицы, отставание rollup"""
+    problems = []
+    with engine.connect() as conn:
+        state = index_state(conn)
+        for name in INDEXES:
+            if name not in state:
+                problems.append(f"missing index {name}")
+        for name, valid in state.items():
+            if not valid:
+                problems.append(f"invalid index {name} (failed concurrent build) — rerun apply")
+        if not rollups_ready(conn):
+            problems.append(f"missing rollup tables {DAILY} / {ASIN_DAILY}")
+            return problems
+        base_max = conn.execute(text(f"SELECT MAX(date) FROM {TABLE}")).scalar()
+        for rollup in (DAILY, ASIN_DAILY):
+            rollup_max = conn.execute(text(f"SELECT MAX(date) FROM {rollup}")).scalar()
+            if base_max and (rollup_max is None or rollup_max < base_max):
+                problems.append(f"{rollup} is stale: {rollup_max} < {base_max}")
+    return problems
+
+
+def _walk(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _walk(child)
+
+
+def seq_scans(conn, query: str, params: dict = None) -> list:
+    """EXPLAIN запроса; возвращает подозрительные Seq Scan по TABLE/rollup.
+    Seq Scan по большой таблице — проблема, если у неё нет (валидных) индексов
+    или если план выбирает малую долю строк; иначе Postgres прав."""
+    base = TABLE.split(".")[1]
+    watched = {t.split(".")[1] for t in (TABLE, DAILY, ASIN_DAILY)}
+    plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {query}"), params or {}).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    found = []
+    for node in _walk(plan[0]["Plan"]):
+        rel = node.get("Relation Name")
+        if node.get("Node Type") != "Seq Scan" or rel not in watched:
+            continue
+        reltuples = conn.execute(text(
+            "SELECT reltuples FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+            "WHERE n.nspname = 'spapi' AND c.relname = :rel"), {"rel": rel}).scalar() or 0
+        if reltuples < SEQ_SCAN_MIN_ROWS:
+            continue
+        if rel == base:
+            state = index_state(conn)
+            bad = [name for name in INDEXES if not state.get(name)]
+            if bad:
+                found.append(f"{rel} (missing/invalid {', '.join(bad)})")
+                continue
+        estimated = node.get("Plan Rows", 0)
+        if estimated < reltuples * SEQ_SCAN_MAX_SHARE:
+            found.append(f"{rel} (~{estimated:,.0f} of {reltuples:,.0f} rows)")
+    return found
+
+
+def dashboard_queries(days_back: int = 30, child_asin: str = None) -> dict:
+    """Запросы, которые дашборд выполняет на каждую загрузку.
+    Список колонок на план доступа не влияет, поэтому SELECT *."""
+    date_from = (datetime.now() - timedelta(days=days_back)).strftime('%Y-%m-%d')
+    queries = {
+        "load_data": (f"SELECT * FROM {TABLE} WHERE date >= :date_from "
+                      f"ORDER BY date DESC, ordered_product_sales DESC",
+                      {"date_from": date_from}),
+    }
+    if child_asin:
+        queries["load_data_asin"] = (
+            f"SELECT * FROM {TABLE} WHERE date >= :date_from AND child_asin = :asin "
+            f"ORDER BY date DESC, ordered_product_sales DESC",
+            {"date_from": date_from, "asin": child_asin})
+    return queries
+
+
+def check(engine, days_back: int = 30, child_asin: str = None) -> dict:
+    """{имя запроса: [таблицы с seq scan]} — только проблемные запросы"""
+    out = {}
+    with engine.connect() as conn:
+        for name, (query, params) in dashboard_queries(days_back, child_asin).items():
+            scans = seq_scans(conn, query, params)
+            if scans:
+                out[name] = scans
+        if rollups_ready(conn):
+            scans = seq_scans(conn, ASIN_LIST_SQL)
+            if scans:
+                out["load_asin_list"] = scans
+    return out
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = p.add_subparsers(dest="cmd", required=True)
+    a = sub.add_parser("apply")
+    a.add_argument("--brin", action="store_true", help="also create a BRIN index on date")
+    r = sub.add_parser("refresh")
+    r.add_argument("--since", help="YYYY-MM-DD (default: today - --days)")
+    r.add_argument("--days", type=int, default=3)
+    sub.add_parser("verify")
+    c = sub.add_parser("check")
+    c.add_argument("--days", type=int, default=30)
+    c.add_argument("--asin")
+    args = p.parse_args(argv)
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    engine = engine_from_env()
+
+    if args.cmd == "apply":
+        for name in apply(engine, brin=args.brin):
+            print(f"ok  {name}")
+    elif args.cmd == "refresh":
+        since = args.since or (datetime.now() - timedelta(days=args.days)).strftime('%Y-%m-%d')
+        refresh_rollups(engine, since)
+        print(f"ok  rollups refreshed since {since}")
+    elif args.cmd == "verify":
+        problems = verify(engine)
+        for msg in problems:
+            print(f"!!  {msg}")
+        if not problems:
+            print("ok  indexes and rollups are in place")
+        return 1 if problems else 0
+    elif args.cmd == "check":
+        bad = check(engine, args.days, args.asin)
+        for name, tables in bad.items():
+            print(f"!!  {name}: Seq Scan on {', '.join(tables)}")
+        if not bad:
+            print("ok  no sequential scans on large tables")
+        return 1 if bad else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,328 @@
+"""
+Лёгкое профилирование дашборда: спаны по этапам рендера страницы.
+
+Включается через PERF_ENABLED=1 (для всех сессий) или ?perf=1 в URL
+(для одной сессии). В выключенном состоянии span() возвращает общий
+no-op контекст — накладные расходы сводятся к одной проверке флага.
+
+Экспорт:
+  - структурированные логи (JSON на спан) в логгер "dashboard.perf":
+    stderr или файл PERF_LOG_FILE;
+  - Prometheus text format: файл PERF_PROM_FILE (textfile collector)
+    и/или HTTP-эндпоинт на порту PERF_PROM_PORT (хост PERF_PROM_HOST,
+    по умолчанию 127.0.0.1).
+
+Холодный старт: milestone() отмечает этапы от старта процесса (один раз
+на процесс), STARTUP_PROFILE=1 дополнительно замеряет время импорта по
+пакетам верхнего уровня. Поэтому perf импортируется в app.py первым и
+сам зависит только от stdlib.
+"""
+
+import builtins
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+log = logging.getLogger("dashboard.perf")
+
+ENV_ENABLED = os.getenv("PERF_ENABLED", "").lower() in ("1", "true", "yes")
+
+# Состояние текущего прогона скрипта. Streamlit исполняет каждую сессию
+# в своём потоке, поэтому спаны держим в thread-local.
+_local = threading.local()
+
+# Агрегаты для Prometheus — общие на процесс
+_metrics_lock = threading.Lock()
+_metrics = {}   # (name, cache) -> {"count", "sum", "rows", "bytes"}
+_server_started = False
+_log_configured = False
+
+
+def _process_start() -> float:
+    """Время старта процесса (epoch). STARTUP_T0 задаёт бенчмарк холодного старта."""
+    if os.getenv("STARTUP_T0"):
+        return float(os.environ["STARTUP_T0"])
+    try:
+        with open("/proc/self/stat") as f:
+            ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        # starttime — тики от загрузки системы; btime из /proc/stat округлён
+        # до секунды, поэтому считаем от текущего CLOCK_BOOTTIME
+        since_start = time.clock_gettime(time.CLOCK_BOOTTIME) - ticks / os.sysconf("SC_CLK_TCK")
+        return time.time() - since_start
+    except (OSError, ValueError, IndexError, AttributeError):
+        return time.time()
+
+
+PROCESS_T0 = _process_start()
+STARTUP_PROFILE = os.getenv("STARTUP_PROFILE", "").lower() in ("1", "true", "yes")
+
+_milestones = {}     # этап -> секунды от старта процесса (первое наступление)
+_import_times = {}   # пакет верхнего уровня -> секунды
+_import_local = threading.local()
+
+
+def milestone(name: str):
+    if name not in _milestones:
+        _milestones[name] = time.time() - PROCESS_T0
+
+
+def _profile_imports():
+    """Оборачивает __import__: время первого импорта по корневому пакету.
+    Вложенные импорты засчитываются внешнему, повторные не считаются."""
+    original = builtins.__import__
+
+    def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules or getattr(_import_local, "active", False):
+            return original(name, globals, locals, fromlist, level)
+        _import_local.active = True
+        t0 = time.perf_counter()
+        try:
+            return original(name, globals, locals, fromlist, level)
+        finally:
+            _import_local.active = False
+            root = name.partition(".")[0]
+            _import_times[root] = _import_times.get(root, 0.0) + time.perf_counter() - t0
+
+    builtins.__import__ = timed_import
+
+
+if STARTUP_PROFILE:
+    _profile_imports()
+
+
+def startup_report() -> dict:
+    """Этапы холодного старта и разбивка импортов (мс)"""
+    return {
+        "milestones_ms": {k: round(v * 1000, 1) for k, v in _milestones.items()},
+        "imports_ms": {k: round(v * 1000, 1) for k, v in
+                       sorted(_import_times.items(), key=lambda kv: -kv[1])},
+    }
+
+
+class Span:
+    __slots__ = ("name", "depth", "start", "duration", "attrs")
+
+    def __init__(self, name: str, depth: int, attrs: dict):
+        self.name = name
+        self.depth = depth
+        self.start = 0.0
+        self.duration = 0.0
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        return self
+
+    def __enter__(self):
+        _local.depth = self.depth + 1
+        if "cache" in self.attrs:
+            _local.miss = False
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        _local.depth = self.depth
+        if "cache" in self.attrs:
+            self.attrs["cache"] = "miss" if _local.miss else "hit"
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        _local.spans.append(self)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attrs):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def enabled() -> bool:
+    return getattr(_local, "enabled", False)
+
+
+def start_run(force: bool = False):
+    """Начало прогона скрипта: сбрасывает спаны и фиксирует флаг"""
+    _local.enabled = ENV_ENABLED or force
+    _local.spans = []
+    _local.depth = 0
+    _local.miss = False
+    if _local.enabled:
+        _ensure_log_handler()
+        _ensure_server()
+
+
+def span(name: str, cached: bool = False, **attrs):
+    """Контекст-менеджер замера этапа.
+    cached=True — этап обёрнут в st.cache_*, hit/miss определяется
+    вызовом mark_miss() из тела кэшируемой функции."""
+    if not getattr(_local, "enabled", False):
+        return _NOOP
+    if cached:
+        attrs["cache"] = None
+    return Span(name, _local.depth, attrs)
+
+
+def mark_miss():
+    """Вызывается внутри кэшируемой функции — значит, кэш промахнулся"""
+    _local.miss = True
+
+
+def spans() -> list:
+    """Спаны текущего прогона в порядке начала"""
+    return sorted(getattr(_local, "spans", []), key=lambda s: s.start)
+
+
+def finish_run():
+    """Конец прогона: пишет логи и обновляет Prometheus-агрегаты"""
+    if not enabled():
+        return
+    run = spans()
+    with _metrics_lock:
+        for s in run:
+            key = (s.name, s.attrs.get("cache") or "")
+            m = _metrics.setdefault(key, {"count": 0, "sum": 0.0, "rows": 0, "bytes": 0})
+            m["count"] += 1
+            m["sum"] += s.duration
+            m["rows"] += int(s.attrs.get("rows") or 0)
+            m["bytes"] += int(s.attrs.get("bytes") or 0)
+    for s in run:
+        log.info(json.dumps({"span": s.name, "depth": s.depth,
+                             "ms": round(s.duration * 1000, 3), **s.attrs},
+                            default=str, ensure_ascii=False))
+    prom_file = os.getenv("PERF_PROM_FILE")
+    if prom_file:
+        _write_prom_file(prom_file)
+
+
+def _write_prom_file(path: str):
+    """Атомарная запись textfile для node_exporter. У каждой сессии свой
+    временный файл; ошибки записи метрик не должны ломать страницу."""
+    tmp = None
+    try:
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                   prefix=".perf-", suffix=".tmp")
+        os.chmod(tmp, 0o644)   # mkstemp создаёт 0600, а читает node_exporter
+        with os.fdopen(fd, "w") as f:
+            f.write(prometheus_text())
+        os.replace(tmp, path)
+    except OSError as e:
+        log.warning("perf: cannot write %s: %s", path, e)
+        if tmp:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+
+def as_rows(run: list = None) -> list:
+    """Спаны в виде строк для таблицы в панели"""
+    run = spans() if run is None else run
+    return [{
+        "stage": "  " * s.depth + s.name,
+        "ms": round(s.duration * 1000, 1),
+        "rows": s.attrs.get("rows"),
+        "bytes": s.attrs.get("bytes"),
+        "cache": s.attrs.get("cache"),
+        "details": ", ".join(f"{k}={v}" for k, v in s.attrs.items()
+                             if k not in ("rows", "bytes", "cache")),
+    } for s in run]
+
+
+def prometheus_text() -> str:
+    def esc(v):
+        return str(v).replace("\\", "\\\\").replace('"', '\\"')
+
+    lines = [
+        "# HELP dashboard_span_seconds Time spent in dashboard stages",
+        "# TYPE dashboard_span_seconds summary",
+    ]
+    with _metrics_lock:
+        items = sorted(_metrics.items())
+    for (name, cache), m in items:
+        labels = f'stage="{esc(name)}",cache="{esc(cache)}"'
+        lines.append(f"dashboard_span_seconds_count{{{labels}}} {m['count']}")
+        lines.append(f"dashboard_span_seconds_sum{{{labels}}} {m['sum']:.6f}")
+    lines += ["# HELP dashboard_span_rows_total Rows processed per stage",
+              "# TYPE dashboard_span_rows_total counter"]
+    for (name, cache), m in items:
+        lines.append(f'dashboard_span_rows_total{{stage="{esc(name)}",cache="{esc(cache)}"}} {m["rows"]}')
+    lines += ["# HELP dashboard_span_bytes_total Bytes produced per stage",
+              "# TYPE dashboard_span_bytes_total counter"]
+    for (name, cache), m in items:
+        lines.append(f'dashboard_span_bytes_total{{stage="{esc(name)}",cache="{esc(cache)}"}} {m["bytes"]}')
+    return "\n".join(lines) + "\n"
+
+
+def _ensure_log_handler():
+    """Свой handler для "dashboard.perf": без него INFO уходит в
+    lastResort, который печатает только WARNING и выше"""
+    global _log_configured
+    if _log_configured:
+        return
+    with _metrics_lock:
+        if _log_configured:
+            return
+        _log_configured = True
+        path = os.getenv("PERF_LOG_FILE")
+        error = None
+        try:
+            handler = logging.FileHandler(path, encoding="utf-8") if path else logging.StreamHandler()
+        except OSError as e:
+            handler, error = logging.StreamHandler(), e
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        log.addHandler(handler)
+        log.setLevel(logging.INFO)
+        log.propagate = False
+    if error:
+        log.warning("perf: cannot open %s, logging to stderr: %s", path, error)
+
+
+def _ensure_server():
+    """Поднимает /metrics на PERF_PROM_PORT один раз на процесс.
+    Любой посетитель может включить perf через ?perf=1, поэтому по умолчанию
+    слушаем только localhost; PERF_PROM_HOST=0.0.0.0 — осознанный выбор."""
+    global _server_started
+    port = os.getenv("PERF_PROM_PORT")
+    host = os.getenv("PERF_PROM_HOST", "127.0.0.1")
+    if not port or _server_started:
+        return
+    with _metrics_lock:
+        if _server_started:
+            return
+        _server_started = True
+
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    try:
+        server = ThreadingHTTPServer((host, int(port)), Handler)
+    except OSError as e:
+        log.warning("perf: cannot bind metrics on %s:%s: %s", host, port, e)
+        return
+    threading.Thread(target=server.serve_forever, daemon=True).start()